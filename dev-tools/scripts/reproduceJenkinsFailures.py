@@ -14,48 +14,56 @@
 # limitations under the License.
 
 import argparse
+import concurrent.futures
 import http.client
+import mmap
 import os
 import re
+import shlex
 import shutil
 import ssl
 import subprocess
 import sys
+import threading
 import time
 import traceback
 import urllib.error
 import urllib.request
 from textwrap import dedent
 
+# These patterns are run over the whole Jenkins log, so they use [^\S\n] rather than \s
+# to keep matches from spanning lines.
+
 # Example: Checking out Revision e441a99009a557f82ea17ee9f9c3e9b89c75cee6 (refs/remotes/origin/master)
-reGitRev = re.compile(r'Checking out Revision (\S+)\s+\(refs/remotes/origin/([^)]+)')
+reGitRev = re.compile(r'^Checking out Revision (\S+)[^\S\n]+\(refs/remotes/origin/([^)]+)', re.MULTILINE)
 
 #         Policeman Jenkins example:           [Lucene-Solr-7.x-Linux] $ /var/lib/jenkins/tools/hudson.tasks.Ant_AntInstallation/ANT_1.8.2/bin/ant "-Dargs=-XX:-UseCompressedOops -XX:+UseConcMarkSweepGC" jenkins-hourly
 # Policeman Jenkins Windows example:      [Lucene-Solr-master-Windows] $ cmd.exe /C "C:\Users\jenkins\tools\hudson.tasks.Ant_AntInstallation\ANT_1.8.2\bin\ant.bat '"-Dargs=-client -XX:+UseConcMarkSweepGC"' jenkins-hourly && exit %%ERRORLEVEL%%"
 #               ASF Jenkins example:        [Lucene-Solr-Tests-master] $ /home/jenkins/tools/ant/apache-ant-1.8.4/bin/ant jenkins-hourly
 #       ASF Jenkins nightly example:                        [checkout] $ /home/jenkins/tools/ant/apache-ant-1.8.4/bin/ant -file build.xml -Dtests.multiplier=2 -Dtests.linedocsfile=/home/jenkins/jenkins-slave/workspace/Lucene-Solr-NightlyTests-master/test-data/enwiki.random.lines.txt jenkins-nightly
 #        ASF Jenkins smoker example: [Lucene-Solr-SmokeRelease-master] $ /home/jenkins/tools/ant/apache-ant-1.8.4/bin/ant nightly-smoke
-reAntInvocation = re.compile(r'\bant(?:\.bat)?\s+.*(?:jenkins-(?:hourly|nightly)|nightly-smoke)')
+reAntInvocation = re.compile(r'\bant(?:\.bat)?[^\S\n]+.*(?:jenkins-(?:hourly|nightly)|nightly-smoke)')
 reAntSysprops = re.compile(r'"-D[^"]+"|-D[^=]+="[^"]*"|-D\S+')
 
 # Method example: NOTE: reproduce with: ant test  -Dtestcase=ZkSolrClientTest -Dtests.method=testMultipleWatchesAsync -Dtests.seed=6EF5AB70F0032849 -Dtests.slow=true -Dtests.locale=he-IL -Dtests.timezone=NST -Dtests.asserts=true -Dtests.file.encoding=UTF-8
 # Suite example:  NOTE: reproduce with: ant test  -Dtestcase=CloudSolrClientTest -Dtests.seed=DB2DF2D8228BAF27 -Dtests.multiplier=3 -Dtests.slow=true -Dtests.locale=es-AR -Dtests.timezone=America/Argentina/Cordoba -Dtests.asserts=true -Dtests.file.encoding=US-ASCII
-reReproLine = re.compile(r'NOTE:\s+reproduce\s+with:(\s+ant\s+test\s+-Dtestcase=(\S+)\s+(?:-Dtests.method=\S+\s+)?(.*))')
+reReproLine = re.compile(r'NOTE:[^\S\n]+reproduce[^\S\n]+with:([^\S\n]+ant[^\S\n]+test[^\S\n]+-Dtestcase=(\S+)[^\S\n]*(?:-Dtests.method=\S+[^\S\n]*)?(.*))')
 reTestsSeed = re.compile(r'-Dtests.seed=\S+\s*')
 
 # Example: https://jenkins.thetaphi.de/job/Lucene-Solr-master-Linux/21108/
 reJenkinsURLWithoutConsoleText = re.compile(r'https?://.*/\d+/?\Z', re.IGNORECASE)
 
-reJavaFile = re.compile(r'(.*)\.java\Z')
-reModule = re.compile(r'\.[\\/](.*)[\\/]src[\\/]')
 reTestOutputFile = re.compile(r'TEST-(.*\.([^-.]+))(?:-\d+)?\.xml\Z')
-reErrorFailure = re.compile(r'(?:errors|failures)="[^0]')
+reErrorFailureBytes = re.compile(rb'(?:errors|failures)="[^0]')
 reGitMainBranch = re.compile(r'^(?:master|branch_[x_\d]+)$')
 
 # consoleText from Policeman Jenkins's Windows jobs fails to decode as UTF-8
 encoding = 'iso-8859-1'
 
 lastFailureCode = 0
+lastFailureCodeLock = threading.Lock()
+outputLock = threading.Lock()
+testModules = None # test -> set of modules, built by groupTestsByModule() for the checked out ref
 gitCheckoutSucceeded = False
 
 description = dedent('''\
@@ -67,6 +75,11 @@ description = dedent('''\
                      in each module of interest, failing at the end if any of the runs fails.
                      To control the maximum number of concurrent JVMs used for each module's
                      test run, set 'tests.jvms', e.g. in ~/lucene.build.properties
+                     Modules are tested concurrently, by default on up to (available CPUs - 2)
+                     modules at once; to override, set the REPRO_MODULE_JOBS environment variable.
+                     When modules are tested concurrently, each module's test output is written to
+                     ./repro-reports/<phase>/logs/<module>.log as it runs, then printed as one block
+                     once that module's run finishes.
                      ''')
 defaultIters = 5
 
@@ -79,24 +92,84 @@ def readConfig():
                       help='Do not run "git" at all')
   parser.add_argument('--iters', dest='testIters', type=int, default=defaultIters, metavar='N',
                       help='Number of iterations per test suite (default: %d)' % defaultIters)
-  return parser.parse_args()
+  config = parser.parse_args()
+  # Validate up front, rather than after compiling all modules
+  config.moduleJobs = None
+  moduleJobs = os.environ.get('REPRO_MODULE_JOBS')
+  if moduleJobs is not None:
+    try:
+      config.moduleJobs = int(moduleJobs)
+    except ValueError:
+      config.moduleJobs = 0
+    if config.moduleJobs < 1:
+      parser.error('REPRO_MODULE_JOBS must be a positive integer, but was "%s"' % moduleJobs)
+  return config
+
+# Commands may be given either as a string, which is split shell-style, or as a list of args.
+# Either way they're run directly, without a shell.
+def splitCmd(cmd):
+  args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+  # Without a shell, Windows doesn't search PATHEXT, so e.g. 'ant' wouldn't find ant.bat
+  executable = shutil.which(args[0])
+  if executable is not None:
+    args[0] = executable
+  return args
+
+# Windows runs .bat/.cmd files (e.g. ant.bat) through cmd.exe, which would interpret unquoted
+# metacharacters, e.g. the '|' in -Dtests.class="*.ATest|*.BTest", so build the cmdline here,
+# quoting any arg that contains them
+reCmdExeSpecialChars = re.compile(r'[\s"|&<>^]')
+
+def popenArgs(cmd):
+  args = splitCmd(cmd)
+  if os.name == 'nt' and args[0].lower().endswith(('.bat', '.cmd')):
+    return ' '.join('"%s"' % arg.replace('"', '""') if arg == '' or reCmdExeSpecialChars.search(arg) else arg
+                    for arg in args)
+  return args
+
+def formatCmd(cmd):
+  return cmd if isinstance(cmd, str) else ' '.join(shlex.quote(arg) for arg in cmd)
 
 def runOutput(cmd):
-  print('[repro] %s' % cmd)
-  try:
-    return subprocess.check_output(cmd.split(' '), universal_newlines=True).strip()
-  except CalledProcessError as e:
-    raise RuntimeError("ERROR: Cmd '%s' failed with exit code %d and the following output:\n%s" 
-                       % (cmd, e.returncode, e.output))
+  print('[repro] %s' % formatCmd(cmd))
+  result = subprocess.run(popenArgs(cmd), capture_output=True, text=True)
+  if 0 != result.returncode:
+    raise RuntimeError("ERROR: Cmd '%s' failed with exit code %d and the following output:\n%s%s" 
+                       % (formatCmd(cmd), result.returncode, result.stdout, result.stderr))
+  return result.stdout.strip()
 
-# Remembers non-zero exit code in lastFailureCode unless rememberFailure==False
-def run(cmd, rememberFailure=True):
+def rememberFailureCode(code):
   global lastFailureCode
-  print('[repro] %s' % cmd)
-  code = os.system(cmd)
-  if 0 != code and rememberFailure:
+  with lastFailureCodeLock, outputLock:
     print('\n[repro] Setting last failure code to %d\n' % code)
     lastFailureCode = code
+
+# Runs cmd in directory cwd (default: the current directory) without changing the process-global
+# CWD, so that it can be called concurrently.  When logFile is given, the command's output is
+# written there as it runs (so it can be tailed) and then printed as one block once the command
+# finishes, so that concurrent runs don't interleave.
+# Remembers non-zero exit code in lastFailureCode unless rememberFailure==False
+def run(cmd, rememberFailure=True, cwd=None, logFile=None):
+  cmdline = '%s%s' % ('' if cwd is None else '%s$ ' % cwd, formatCmd(cmd))
+  with outputLock:
+    print('[repro] %s%s' % (cmdline, '' if logFile is None else '\n[repro]   Output: %s' % logFile), flush=True)
+  try:
+    if logFile is not None:
+      with open(logFile, 'w+b') as log:
+        result = subprocess.run(popenArgs(cmd), cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        log.seek(0)
+        with outputLock:
+          print('\n[repro] Output of %s (exit code %d):' % (cmdline, result.returncode), flush=True)
+          shutil.copyfileobj(log, sys.stdout.buffer)
+          sys.stdout.buffer.flush()
+    else:
+      result = subprocess.run(popenArgs(cmd), cwd=cwd)
+    code = result.returncode
+  except FileNotFoundError as e:
+    print('[repro] %s' % e)
+    code = 127 # Same as the shell's "command not found"
+  if 0 != code and rememberFailure:
+    rememberFailureCode(code)
   return code
 
 def fetchAndParseJenkinsLog(url, numRetries):
@@ -106,31 +179,31 @@ def fetchAndParseJenkinsLog(url, numRetries):
   revisionFromLog = None
   antOptions = ''
   tests = {}
+  if reJenkinsURLWithoutConsoleText.match(url):
+    print('[repro] URL points to a Jenkins build page rather than its log. Appending "/consoleText".')
+    url = url.rstrip('/') + '/consoleText'
   print('[repro] Jenkins log URL: %s\n' % url)
   try:
     # HTTPS fails at certificate validation, see LUCENE-9412, PEP-476
     context = ssl._create_unverified_context()
     with urllib.request.urlopen(url, context=context) as consoleText:
-      for rawLine in consoleText:
-        line = rawLine.decode(encoding)
-        match = reGitRev.match(line)
-        if match is not None:
-          revisionFromLog = match.group(1)
-          branchFromLog = match.group(2)
-          print('[repro] Revision: %s\n' % revisionFromLog)
-        else:
-          match = reReproLine.search(line)
-          if match is not None:
-            print('[repro] Repro line: %s\n' % match.group(1))
-            testcase = match.group(2)
-            reproLineWithoutMethod = match.group(3).strip()
-            tests[testcase] = reproLineWithoutMethod
-          else:
-            match = reAntInvocation.search(line)
-            if match is not None:
-              antOptions = ' '.join(reAntSysprops.findall(line))
-              if len(antOptions) > 0:
-                print('[repro] Ant options: %s' % antOptions)
+      log = consoleText.read().decode(encoding)
+    # Scan the whole log at once rather than line-by-line: almost no lines match
+    for match in reGitRev.finditer(log):
+      revisionFromLog = match.group(1)
+      branchFromLog = match.group(2)
+      print('[repro] Revision: %s\n' % revisionFromLog)
+    for match in reAntInvocation.finditer(log):
+      lineEnd = log.find('\n', match.end())
+      line = log[(log.rfind('\n', 0, match.start()) + 1):(len(log) if lineEnd < 0 else lineEnd)]
+      antOptions = ' '.join(reAntSysprops.findall(line))
+      if len(antOptions) > 0:
+        print('[repro] Ant options: %s' % antOptions)
+    for match in reReproLine.finditer(log):
+      print('[repro] Repro line: %s\n' % match.group(1))
+      testcase = match.group(2)
+      reproLineWithoutMethod = match.group(3).strip()
+      tests[testcase] = reproLineWithoutMethod
   except urllib.error.URLError as e:
     raise RuntimeError('ERROR: fetching %s : %s' % (url, e))
   except http.client.IncompleteRead as e:
@@ -143,11 +216,7 @@ def fetchAndParseJenkinsLog(url, numRetries):
       raise RuntimeError('ERROR: fetching %s : %s' % (url, e))
 
   if revisionFromLog == None:
-    if reJenkinsURLWithoutConsoleText.match(url):
-      print('[repro] Not a Jenkins log. Appending "/consoleText" and retrying ...\n')
-      return fetchAndParseJenkinsLog(url + '/consoleText', numRetries)                                                        
-    else:
-      raise RuntimeError('ERROR: %s does not appear to be a Jenkins log.' % url)
+    raise RuntimeError('ERROR: %s does not appear to be a Jenkins log.' % url)
   if 0 == len(tests):
     print('[repro] No "reproduce with" lines found; exiting.')
     sys.exit(0)
@@ -155,6 +224,7 @@ def fetchAndParseJenkinsLog(url, numRetries):
 
 def prepareWorkspace(useGit, gitRef):
   global gitCheckoutSucceeded
+  global testModules
   if useGit:
     code = run('git fetch')
     if 0 != code:
@@ -172,25 +242,63 @@ def prepareWorkspace(useGit, gitRef):
       if 0 != code:
         raise RuntimeError('ERROR: "%s" failed.  See above.' % checkoutBranchCmd)
     gitCheckoutSucceeded = True
+    testModules = None # Test classes may have moved or been removed at the new ref
     run('git merge --ff-only', rememberFailure=False) # Ignore failure on non-branch ref
   
   code = run('ant clean')
   if 0 != code:
     raise RuntimeError('ERROR: "ant clean" failed.  See above.')
 
+# Like os.walk(top), yields (dir, fileNames) for each directory under top, but uses the
+# file type info cached by os.scandir() rather than stat'ing every entry.  The listing of
+# each directory is complete before it's yielded, so callers may move files out of it.
+def walkFiles(top):
+  dirs = [top]
+  while len(dirs) > 0:
+    dir = dirs.pop()
+    fileNames = []
+    try:
+      with os.scandir(dir) as entries:
+        for entry in entries:
+          if entry.is_dir(follow_symlinks=False):
+            dirs.append(entry.path)
+          elif entry.is_file():
+            fileNames.append(entry.name)
+    except OSError: # Like os.walk, skip directories that can't be listed
+      continue
+    yield (dir, fileNames)
+
+# Walks the workspace once, returning the module(s) containing each of the given tests
+def indexTestModules(tests):
+  testModules = {}
+  srcDir = os.sep + 'src' + os.sep
+  for (dir, files) in walkFiles('.'):
+    srcDirIndex = dir.find(srcDir)
+    if srcDirIndex < 0: # Not a module source dir
+      continue
+    module = dir[2:srcDirIndex] # strip './' prefix
+    for file in files:
+      if not file.endswith('.java'):
+        continue
+      test = file[:-5] # strip '.java'
+      if test in tests:
+        if test not in testModules:
+          testModules[test] = set()
+        testModules[test].add(module)
+  return testModules
+
 def groupTestsByModule(tests):
+  global testModules
+  # Tests retested at the same ref are a subset of those last indexed, so the index is
+  # reused until prepareWorkspace() checks out another ref
+  if testModules is None:
+    testModules = indexTestModules(tests)
   modules = {}
-  for (dir, _, files) in os.walk('.'):
-    for file in files:
-      match = reJavaFile.search(file)
-      if match is not None:
-        test = match.group(1)
-        if test in tests:
-          match = reModule.match(dir)
-          module = match.group(1)
-          if module not in modules:
-            modules[module] = set()
-          modules[module].add(test)
+  for test in tests:
+    for module in testModules.get(test, ()):
+      if module not in modules:
+        modules[module] = set()
+      modules[module].add(test)
   print('[repro] Test suites by module:')
   for module in modules:
     print('[repro]    %s' % module)
@@ -198,49 +306,107 @@ def groupTestsByModule(tests):
       print('[repro]       %s' % test)
   return modules
 
-def runTests(testIters, modules, tests):
+def getModuleJobs(moduleJobs, numModules):
+  if moduleJobs is not None:
+    jobs = moduleJobs
+  else:
+    try:
+      availableCpus = len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on all platforms, e.g. macOS and Windows
+      availableCpus = os.cpu_count() or 2
+    # Leave a couple of cores free, since each module's test run forks its own 'tests.jvms' JVMs
+    jobs = availableCpus - 2
+  return max(1, min(numModules, jobs))
+
+def runTests(testIters, moduleJobs, modules, tests, logDir):
   cwd = os.getcwd()
   testCmdline = 'ant test-nocompile -Dtests.dups=%d -Dtests.maxfailures=%d -Dtests.class="%s" -Dtests.showOutput=onerror %s %s'
+  moduleTestCmdlines = []
+  # Compile serially: modules share upstream build output (e.g. lucene/core), which concurrent
+  # compiles would race to (re)build
   for module in modules:
-    moduleTests = list(modules[module])
-    testList = '|'.join(map(lambda t: '*.%s' % t, moduleTests))
+    moduleTests = sorted(modules[module]) # Deterministic cmdline
+    testList = '|'.join('*.%s' % t for t in moduleTests)
     numTests = len(moduleTests)   
     params = tests[moduleTests[0]] # Assumption: all tests in this module have the same cmdline params
-    os.chdir(module)
-    code = run('ant compile-test')
-    try:
-      if 0 != code:
-        raise RuntimeError("ERROR: Compile failed in %s/ with code %d.  See above." % (module, code))
-      run(testCmdline % (testIters, testIters * numTests, testList, antOptions, params))
-    finally:
-      os.chdir(cwd)
+    for test in moduleTests[1:]:
+      if tests[test] != params:
+        print('[repro] WARNING: %s will be run with the cmdline params of %s in %s/: "%s", rather than its own: "%s"'
+              % (test, moduleTests[0], module, params, tests[test]))
+    moduleDir = os.path.join(cwd, module)
+    code = run('ant compile-test', cwd=moduleDir)
+    if 0 != code:
+      raise RuntimeError("ERROR: Compile failed in %s/ with code %d.  See above." % (module, code))
+    moduleTestCmdlines.append((module, testCmdline % (testIters, testIters * numTests, testList, antOptions, params), moduleDir))
+
+  jobs = getModuleJobs(moduleJobs, len(moduleTestCmdlines))
+  print('[repro] Testing %d module(s) with up to %d concurrent job(s)' % (len(moduleTestCmdlines), jobs))
+  if jobs > 1: # Send each module's output to its own log, rather than interleaving it on stdout
+    logDir = os.path.join(cwd, logDir)
+    os.makedirs(logDir, exist_ok=True)
+  with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+    futures = [executor.submit(run, cmdline, cwd=moduleDir,
+                               logFile=os.path.join(logDir, '%s.log' % module.replace(os.sep, '.')) if jobs > 1 else None)
+               for (module, cmdline, moduleDir) in moduleTestCmdlines]
+    for future in futures:
+      future.result()
       
+# The error and failure counts are attributes of the root <testsuite> element, so usually
+# only the head of each JUnit XML report needs to be scanned
+testOutputHeadSize = 8192
+# Reports at least this big are memory-mapped and scanned in place when the head isn't enough
+testOutputMmapMinSize = 65536
+
+def testOutputHasErrorOrFailure(filePath):
+  # Match bytes: the attributes of interest are ASCII, so there's no need to decode
+  with open(filePath, 'rb') as testOutputFile:
+    head = testOutputFile.read(testOutputHeadSize)
+    if reErrorFailureBytes.search(head) is not None:
+      return True
+    if b'errors="' in head and b'failures="' in head: # Both counts were seen, and both are zero
+      return False
+    if os.fstat(testOutputFile.fileno()).st_size < testOutputMmapMinSize:
+      return reErrorFailureBytes.search(head + testOutputFile.read()) is not None
+    with mmap.mmap(testOutputFile.fileno(), 0, access=mmap.ACCESS_READ) as testOutput:
+      return reErrorFailureBytes.search(testOutput) is not None
+
 def printAndMoveReports(testIters, newSubDir, location):
   failures = {}
+  testOutputFiles = []
+  testOutputFileSearch = reTestOutputFile.search
   for start in ('lucene/build', 'solr/build'):
-    for (dir, _, files) in os.walk(start):
+    for (dir, files) in walkFiles(start):
       for file in files:
-        testOutputFileMatch = reTestOutputFile.search(file)
+        if not (file.startswith('TEST-') and file.endswith('.xml')):
+          continue
+        testOutputFileMatch = testOutputFileSearch(file)
         if testOutputFileMatch is not None:
-          testcase = testOutputFileMatch.group(1)
-          if testcase not in failures:
-            failures[testcase] = 0
-          filePath = os.path.join(dir, file)
-          with open(filePath, encoding='UTF-8') as testOutputFile:
-            for line in testOutputFile:
-              errorFailureMatch = reErrorFailure.search(line)
-              if errorFailureMatch is not None:
-                failures[testcase] += 1
-                break
-          # have to play nice with 'ant clean'...
-          newDirPath = os.path.join('repro-reports', newSubDir, dir)
-          os.makedirs(newDirPath, exist_ok=True)
-          os.rename(filePath, os.path.join(newDirPath, file))
+          testOutputFiles.append((dir, file, testOutputFileMatch.group(1)))
+
+  # Scanning is I/O bound, so use more threads than CPUs
+  with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+    hasErrorOrFailure = executor.map(testOutputHasErrorOrFailure,
+                                     [os.path.join(dir, file) for (dir, file, _) in testOutputFiles])
+    for ((dir, file, testcase), failed) in zip(testOutputFiles, hasErrorOrFailure):
+      if testcase not in failures:
+        failures[testcase] = 0
+      if failed:
+        failures[testcase] += 1
+      # have to play nice with 'ant clean'...
+      newDirPath = os.path.join('repro-reports', newSubDir, dir)
+      os.makedirs(newDirPath, exist_ok=True)
+      os.rename(os.path.join(dir, file), os.path.join(newDirPath, file))
   print("[repro] Failures%s:" % location)
   for testcase in sorted(failures, key=lambda t: (failures[t],t)): # sort by failure count, then by testcase 
     print("[repro]   %d/%d failed: %s" % (failures[testcase], testIters, testcase))
   return failures
 
+def runPhase(config, tests, useGit, gitRef, newSubDir, location):
+  prepareWorkspace(useGit, gitRef)
+  modules = groupTestsByModule(tests)
+  runTests(config.testIters, config.moduleJobs, modules, tests, os.path.join('repro-reports', newSubDir, 'logs'))
+  return printAndMoveReports(config.testIters, newSubDir, location)
+
 def getLocalGitBranch():
   origGitBranch = runOutput('git rev-parse --abbrev-ref HEAD')
   if origGitBranch == 'HEAD':                       # In detached HEAD state
@@ -260,43 +426,27 @@ def main():
     if os.path.isdir('repro-reports'):
       print('[repro]   Deleting old ./repro-reports');
       shutil.rmtree('repro-reports')
-    prepareWorkspace(config.useGit, revisionFromLog)
-    modules = groupTestsByModule(tests)
-    runTests(config.testIters, modules, tests)
-    failures = printAndMoveReports(config.testIters, 'orig',
-                                   ' w/original seeds' + (' at %s' % revisionFromLog if config.useGit else ''))
-                                  
-    
+    failures = runPhase(config, tests, config.useGit, revisionFromLog, 'orig',
+                        ' w/original seeds' + (' at %s' % revisionFromLog if config.useGit else ''))
+
     if config.useGit:
-      # Retest 100% failures at the tip of the branch
-      oldTests = tests
-      tests = {}
-      for fullClass in failures:
-        testcase = fullClass[(fullClass.rindex('.') + 1):]
-        if failures[fullClass] == config.testIters:
-          tests[testcase] = oldTests[testcase]
-      if len(tests) > 0:
-        print('\n[repro] Re-testing 100%% failures at the tip of %s' % branchFromLog)
-        prepareWorkspace(True, branchFromLog)
-        modules = groupTestsByModule(tests)
-        runTests(config.testIters, modules, tests)
-        failures = printAndMoveReports(config.testIters, 'branch-tip',
-                                       ' original seeds at the tip of %s' % branchFromLog)
-      
-        # Retest 100% tip-of-branch failures without a seed
+      # Each phase retests the previous phase's 100% failures:
+      #   (phaseDescription, useGit, newSubDir, transformParams)
+      retestPhases = [(' w/original seeds at the tip of %s' % branchFromLog, True, 'branch-tip',
+                       lambda params: params),
+                      (' at the tip of %s without a seed' % branchFromLog, False, 'branch-tip-no-seed',
+                       lambda params: reTestsSeed.sub('', params))]
+      for (phaseDescription, useGit, newSubDir, transformParams) in retestPhases:
         oldTests = tests
         tests = {}
         for fullClass in failures:
           testcase = fullClass[(fullClass.rindex('.') + 1):]
           if failures[fullClass] == config.testIters:
-            tests[testcase] = re.sub(reTestsSeed, '', oldTests[testcase])
-        if len(tests) > 0:
-          print('\n[repro] Re-testing 100%% failures at the tip of %s without a seed' % branchFromLog)
-          prepareWorkspace(False, branchFromLog)
-          modules = groupTestsByModule(tests)
-          runTests(config.testIters, modules, tests)
-          printAndMoveReports(config.testIters, 'branch-tip-no-seed',
-                              ' at the tip of %s without a seed' % branchFromLog)
+            tests[testcase] = transformParams(oldTests[testcase])
+        if 0 == len(tests):
+          break
+        print('\n[repro] Re-testing 100%% failures%s' % phaseDescription)
+        failures = runPhase(config, tests, useGit, branchFromLog, newSubDir, phaseDescription)
   except Exception as e:
     print('[repro] %s' % traceback.format_exc())
     sys.exit(1)